@@ -16,7 +16,13 @@
 
 """
 
+import hashlib
 import logging
+import math
+import multiprocessing.pool
+import os
+import pickle
+import tempfile
 
 import bpy
 import kubric as kb
@@ -31,6 +37,39 @@ STATIC_SPAWN_REGION = [(-7, -7, 0), (7, 7, 10)]
 DYNAMIC_SPAWN_REGION = [(-5, -5, 1), (5, 5, 5)]
 VELOCITY_RANGE = [(-4., -4., 0.), (4., 4., 0.)]
 
+
+def postprocess_and_save(data_stack, scene, collisions, flags, output_dir):
+  """Filters/sorts the visible objects, then writes images, metadata and events to output_dir."""
+  kb.compute_visibility(data_stack["segmentation"], scene.assets)
+  visible_foreground_assets = kb.post_processing.get_visible_assets(scene.foreground_assets)
+
+  data_stack["segmentation"] = kb.adjust_segmentation_idxs(
+      data_stack["segmentation"],
+      scene.assets,
+      visible_foreground_assets)
+  scene.metadata["num_instances"] = len(visible_foreground_assets)
+
+  # Save to image files (in the background, overlapping with the metadata below)
+  with multiprocessing.pool.ThreadPool(1) as pool:
+    image_writes = pool.apply_async(kb.write_image_dict, (data_stack, output_dir))
+    kb.post_processing.compute_bboxes(data_stack["segmentation"],
+                                      visible_foreground_assets)
+
+    # --- Metadata
+    logging.info("Collecting and storing metadata for each object.")
+    kb.write_json(filename=output_dir / "metadata.json", data={
+        "flags": vars(flags),
+        "metadata": kb.get_scene_metadata(scene),
+        "camera": kb.get_camera_info(scene.camera),
+        "instances": kb.get_instance_info(scene, visible_foreground_assets),
+    })
+    kb.write_json(filename=output_dir / "events.json", data={
+        "collisions":  kb.process_collisions(
+            collisions, scene, assets_subset=visible_foreground_assets),
+    })
+    image_writes.get()
+
+
 # --- CLI arguments
 parser = kb.ArgumentParser()
 parser.add_argument("--objects_split", choices=["train", "test"],
@@ -64,6 +103,11 @@ parser.add_argument("--hdri_assets", type=str,
                     default="gs://kubric-public/assets/HDRI_haven/HDRI_haven.json")
 parser.add_argument("--gso_assets", type=str,
                     default="gs://kubric-public/assets/GSO/GSO.json")
+parser.add_argument("--settle_cache_dir", type=str, default="~/.cache/kubric_settle",
+                    help="where to cache the static object state after settling "
+                         "(empty string disables the cache)")
+parser.add_argument("--render_workers", type=int, default=1,
+                    help="number of Blender processes the frames are split across")
 parser.add_argument("--save_state", dest="save_state", action="store_true")
 parser.set_defaults(save_state=False, frame_end=24, frame_rate=12,
                     resolution=256)
@@ -80,9 +124,11 @@ scratch_train_dir = scratch_dir.joinpath("train")
 simulator = PyBullet(scene, scratch_train_dir)
 renderer = Blender(scene, scratch_train_dir, use_denoising=True, samples_per_pixel=64,
                    motion_blur=motion_blur)
-kubasic = kb.AssetSource.from_manifest(FLAGS.kubasic_assets)
-gso = kb.AssetSource.from_manifest(FLAGS.gso_assets)
-hdri_source = kb.AssetSource.from_manifest(FLAGS.hdri_assets)
+# the three manifests are independent downloads, so fetch them concurrently
+with multiprocessing.pool.ThreadPool(3) as pool:
+  kubasic, gso, hdri_source = pool.map(
+      kb.AssetSource.from_manifest,
+      [FLAGS.kubasic_assets, FLAGS.gso_assets, FLAGS.hdri_assets])
 
 
 # --- Populate the scene
@@ -121,26 +167,25 @@ scene.camera = kb.PerspectiveCamera(focal_length=35., sensor_width=32)
 # we start one frame early and end one frame late to ensure that
 # forward and backward flow are still consistent for the last and first frames
 
-theta = rng.uniform(0, 2 * np.pi)
-phi = rng.uniform(np.deg2rad(30), np.deg2rad(60))
+theta = rng.uniform(0, 2 * math.pi)
+phi = rng.uniform(math.radians(30), math.radians(60))
+sin_phi, cos_phi = math.sin(phi), math.cos(phi)
 radius = rng.uniform(FLAGS.min_radius**3, FLAGS.max_radius**3) ** (1/3.) 
 
 num_frames = FLAGS.frame_end - FLAGS.frame_start + 1
 
-for frame in range(FLAGS.frame_start - 1, FLAGS.frame_end + 2):
-  
-  theta_curr = theta + (frame - FLAGS.frame_start + 1) * 2 * np.pi / num_frames
-  phi_curr = phi
-
-  xyz_curr = np.zeros(3)
-  xyz_curr[0] = np.cos(theta_curr) * np.sin(phi_curr)
-  xyz_curr[1] = np.sin(theta_curr) * np.sin(phi_curr)
-  xyz_curr[2] = np.cos(phi_curr)
-
-  xyz_curr = xyz_curr * radius
+frames = np.arange(FLAGS.frame_start - 1, FLAGS.frame_end + 2)
+theta_step = 2 * math.pi / num_frames
+thetas = theta + (frames - FLAGS.frame_start + 1) * theta_step
+xyz = np.stack([np.cos(thetas) * sin_phi,
+                np.sin(thetas) * sin_phi,
+                np.full_like(thetas, cos_phi)], axis=1) * radius
 
+quats = kb.core.look_at_quats(xyz, (0, 0, 0), scene.camera.up, scene.camera.front)
+for frame, xyz_curr, quat_curr in zip(frames, xyz, quats):
+  frame = int(frame)
   scene.camera.position = xyz_curr
-  scene.camera.look_at((0, 0, 0))
+  scene.camera.quaternion = quat_curr
   scene.camera.keyframe_insert("position", frame)
   scene.camera.keyframe_insert("quaternion", frame)
 
@@ -156,15 +201,30 @@ else:
 
 
 
-# add STATIC objects
+# sample all objects up front, so that their files can be fetched in the background
+# (the DYNAMIC ones while the static objects settle)
 num_static_objects = rng.randint(FLAGS.min_num_static_objects,
                                  FLAGS.max_num_static_objects+1)
+num_dynamic_objects = rng.randint(FLAGS.min_num_dynamic_objects,
+                                  FLAGS.max_num_dynamic_objects+1)
+chosen_asset_ids = rng.choice(active_split, size=num_static_objects + num_dynamic_objects)
+static_asset_ids = chosen_asset_ids[:num_static_objects]
+dynamic_asset_ids = chosen_asset_ids[num_static_objects:]
+unique_asset_ids = list(dict.fromkeys(chosen_asset_ids))  # in order of first use
+prefetch_pool = multiprocessing.pool.ThreadPool(max(1, min(8, len(unique_asset_ids))))
+prefetched_assets = {asset_id: prefetch_pool.apply_async(gso.prefetch, (asset_id,))
+                     for asset_id in unique_asset_ids}
+
+# add STATIC objects
 logging.info("Randomly placing %d static objects:", num_static_objects)
+static_scales = rng.uniform(0.75, 3.0, size=num_static_objects)
 for i in range(num_static_objects):
-  obj = gso.create(asset_id=rng.choice(active_split))
+  prefetched_assets[static_asset_ids[i]].get()  # wait until the files are unpacked
+  obj = gso.create(asset_id=static_asset_ids[i])
   assert isinstance(obj, kb.FileBasedObject)
-  scale = rng.uniform(0.75, 3.0)
-  obj.scale = scale / np.max(obj.bounds[1] - obj.bounds[0])
+  scale = float(static_scales[i])
+  (min_x, min_y, min_z), (max_x, max_y, max_z) = obj.bounds
+  obj.scale = scale / max(max_x - min_x, max_y - min_y, max_z - min_z)
   obj.metadata["scale"] = scale
   scene += obj
   kb.move_until_no_overlap(obj, simulator, spawn_region=STATIC_SPAWN_REGION,
@@ -177,8 +237,42 @@ for i in range(num_static_objects):
   obj_blender.cycles_visibility.shadow = False
 
 
-logging.info("Running 100 frames of simulation to let static objects settle ...")
-_, _ = simulator.run(frame_start=-100, frame_end=0)
+# the settled poses only depend on the initial static setup, so they are cached on disk
+settle_inputs = (
+    [(str(obj.asset_id), float(obj.metadata["scale"]), tuple(map(float, obj.position)),
+      tuple(map(float, obj.quaternion)), obj.friction, obj.restitution)
+     for obj in scene.foreground_assets],
+    (dome.friction, dome.restitution),
+    (scene.frame_rate, scene.step_rate, tuple(map(float, scene.gravity))))
+settle_key = hashlib.sha256(pickle.dumps(settle_inputs)).hexdigest()
+settle_cache_file = None
+if FLAGS.settle_cache_dir:
+  settle_cache_file = os.path.join(os.path.expanduser(FLAGS.settle_cache_dir),
+                                   f"{settle_key}.pkl")
+if settle_cache_file and os.path.exists(settle_cache_file):
+  logging.info("Using the cached settled state from '%s'", settle_cache_file)
+  with open(settle_cache_file, "rb") as fp:
+    settled_state = pickle.load(fp)
+  # restore everything simulator.run leaves behind, so the dynamic simulation is
+  # the same as without the cache (including the residual angular velocities)
+  for obj, (position, quaternion, velocity, angular_velocity) in zip(
+      scene.foreground_assets, settled_state):
+    obj.position = position
+    obj.quaternion = quaternion
+    obj.velocity = velocity
+    obj.angular_velocity = angular_velocity
+else:
+  logging.info("Running 100 frames of simulation to let static objects settle ...")
+  _, _ = simulator.run(frame_start=-100, frame_end=0)
+  if settle_cache_file:
+    settled_state = [(obj.position, obj.quaternion, obj.velocity, obj.angular_velocity)
+                     for obj in scene.foreground_assets]
+    # write to a temporary file first, so concurrent runs never read a partial pickle
+    os.makedirs(os.path.dirname(settle_cache_file), exist_ok=True)
+    with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(settle_cache_file),
+                                     delete=False) as fp:
+      pickle.dump(settled_state, fp)
+    os.replace(fp.name, settle_cache_file)
 
 
 # stop any objects that are still moving and reset friction / restitution
@@ -195,24 +289,26 @@ dome.restitution = FLAGS.floor_restitution
 
 
 # Add DYNAMIC objects
-num_dynamic_objects = rng.randint(FLAGS.min_num_dynamic_objects,
-                                  FLAGS.max_num_dynamic_objects+1)
 logging.info("Randomly placing %d dynamic objects:", num_dynamic_objects)
+dynamic_scales = rng.uniform(0.75, 3.0, size=num_dynamic_objects)
+velocities = rng.uniform(*VELOCITY_RANGE, size=(num_dynamic_objects, 3))
 for i in range(num_dynamic_objects):
-  obj = gso.create(asset_id=rng.choice(active_split))
+  prefetched_assets[dynamic_asset_ids[i]].get()  # wait until the files are unpacked
+  obj = gso.create(asset_id=dynamic_asset_ids[i])
   assert isinstance(obj, kb.FileBasedObject)
-  scale = rng.uniform(0.75, 3.0)
-  obj.scale = scale / np.max(obj.bounds[1] - obj.bounds[0])
+  scale = float(dynamic_scales[i])
+  (min_x, min_y, min_z), (max_x, max_y, max_z) = obj.bounds
+  obj.scale = scale / max(max_x - min_x, max_y - min_y, max_z - min_z)
   obj.metadata["scale"] = scale
   scene += obj
   kb.move_until_no_overlap(obj, simulator, spawn_region=DYNAMIC_SPAWN_REGION,
                            rng=rng)
-  obj.velocity = (rng.uniform(*VELOCITY_RANGE) -
-                  [obj.position[0], obj.position[1], 0])
+  obj.velocity = velocities[i] - [obj.position[0], obj.position[1], 0]
   obj.metadata["is_dynamic"] = True
   obj_blender = obj.linked_objects[renderer]
   obj_blender.cycles_visibility.shadow = False
   logging.info("    Added %s at %s", obj.asset_id, obj.position)  
+prefetch_pool.close()
 
 
 if FLAGS.save_state:
@@ -233,42 +329,10 @@ if FLAGS.save_state:
 
 
 logging.info("Rendering the train scene ...")
-data_stack = renderer.render()
+data_stack = renderer.render(num_workers=FLAGS.render_workers)
 
 # --- Postprocessing
-kb.compute_visibility(data_stack["segmentation"], scene.assets)
-visible_foreground_assets = [asset for asset in scene.foreground_assets
-                             if np.max(asset.metadata["visibility"]) > 0]
-visible_foreground_assets = sorted(  # sort assets by their visibility
-    visible_foreground_assets,
-    key=lambda asset: np.sum(asset.metadata["visibility"]),
-    reverse=True)
-
-data_stack["segmentation"] = kb.adjust_segmentation_idxs(
-    data_stack["segmentation"],
-    scene.assets,
-    visible_foreground_assets)
-scene.metadata["num_instances"] = len(visible_foreground_assets)
-
-train_output_dir = output_dir.joinpath("train")
-
-# Save to image files
-kb.write_image_dict(data_stack, train_output_dir)
-kb.post_processing.compute_bboxes(data_stack["segmentation"],
-                                  visible_foreground_assets)
-
-# --- Metadata
-logging.info("Collecting and storing metadata for each object.")
-kb.write_json(filename=train_output_dir / "metadata.json", data={
-    "flags": vars(FLAGS),
-    "metadata": kb.get_scene_metadata(scene),
-    "camera": kb.get_camera_info(scene.camera),
-    "instances": kb.get_instance_info(scene, visible_foreground_assets),
-})
-kb.write_json(filename=train_output_dir / "events.json", data={
-    "collisions":  kb.process_collisions(
-        collisions, scene, assets_subset=visible_foreground_assets),
-})
+postprocess_and_save(data_stack, scene, collisions, FLAGS, output_dir.joinpath("train"))
 
 ###########################
 ## Rendering test scenes
@@ -276,20 +340,20 @@ kb.write_json(filename=train_output_dir / "events.json", data={
 scratch_test_dir = scratch_dir.joinpath("test")
 eval_output_dir = output_dir.joinpath("test")
 
-scene.camera = kb.PerspectiveCamera(focal_length=35., sensor_width=32)
-
-for frame in range(FLAGS.frame_start - 1, FLAGS.frame_end + 2):
-  
-  theta_curr = rng.uniform(0, 2 * np.pi)
-  phi_curr = phi
+# Reuse the train camera (and the already simulated scene): only its keyframes
+# are overwritten, for the same frames that were keyed for the train views.
 
-  xyz_curr = np.zeros(3)
-  xyz_curr[0] = np.cos(theta_curr) * np.sin(phi_curr)
-  xyz_curr[1] = np.sin(theta_curr) * np.sin(phi_curr)
-  xyz_curr[2] = np.cos(phi_curr)
+# same draws as sampling one theta per frame, but in a single call
+test_thetas = rng.uniform(0, 2 * math.pi, size=len(frames))
+test_xyz = np.stack([np.cos(test_thetas) * sin_phi,
+                     np.sin(test_thetas) * sin_phi,
+                     np.full_like(test_thetas, cos_phi)], axis=1) * radius
 
-  scene.camera.position = xyz_curr * radius
-  scene.camera.look_at((0, 0, 0))
+test_quats = kb.core.look_at_quats(test_xyz, (0, 0, 0), scene.camera.up, scene.camera.front)
+for frame, xyz_curr, quat_curr in zip(frames, test_xyz, test_quats):
+  frame = int(frame)
+  scene.camera.position = xyz_curr
+  scene.camera.quaternion = quat_curr
   scene.camera.keyframe_insert("position", frame)
   scene.camera.keyframe_insert("quaternion", frame)
 
@@ -297,38 +361,7 @@ for frame in range(FLAGS.frame_start - 1, FLAGS.frame_end + 2):
 logging.info("Rendering the test scene ...")
 simulator.scratch_dir = scratch_test_dir
 renderer.scratch_dir = scratch_test_dir
-data_stack = renderer.render()
+data_stack = renderer.render(num_workers=FLAGS.render_workers)
 
 # --- Postprocessing
-kb.compute_visibility(data_stack["segmentation"], scene.assets)
-visible_foreground_assets = [asset for asset in scene.foreground_assets
-                             if np.max(asset.metadata["visibility"]) > 0]
-visible_foreground_assets = sorted(  # sort assets by their visibility
-    visible_foreground_assets,
-    key=lambda asset: np.sum(asset.metadata["visibility"]),
-    reverse=True)
-
-data_stack["segmentation"] = kb.adjust_segmentation_idxs(
-    data_stack["segmentation"],
-    scene.assets,
-    visible_foreground_assets)
-scene.metadata["num_instances"] = len(visible_foreground_assets)
-
-
-# Save to image files
-kb.write_image_dict(data_stack, eval_output_dir)
-kb.post_processing.compute_bboxes(data_stack["segmentation"],
-                                  visible_foreground_assets)
-
-# --- Metadata
-logging.info("Collecting and storing metadata for each object.")
-kb.write_json(filename=eval_output_dir / "metadata.json", data={
-    "flags": vars(FLAGS),
-    "metadata": kb.get_scene_metadata(scene),
-    "camera": kb.get_camera_info(scene.camera),
-    "instances": kb.get_instance_info(scene, visible_foreground_assets),
-})
-kb.write_json(filename=eval_output_dir / "events.json", data={
-    "collisions":  kb.process_collisions(
-        collisions, scene, assets_subset=visible_foreground_assets),
-})
\ No newline at end of file
+postprocess_and_save(data_stack, scene, collisions, FLAGS, eval_output_dir)
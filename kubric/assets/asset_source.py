@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import logging
+import os
 import pathlib
+import pickle
 import shutil
 import tarfile
 import tempfile
@@ -22,7 +25,7 @@ import numpy as np
 import tensorflow as tf
 import thefuzz.process
 
-from typing import Optional, Dict, Any, Type
+from typing import Optional, Dict, Any, List, Sequence, Tuple, Type
 import weakref
 
 from kubric import core
@@ -30,6 +33,40 @@ from kubric import file_io
 from kubric.kubric_typing import PathLike
 
 
+def _read_cached_manifest(
+    manifest_path: PathLike,
+    cache_dir: PathLike
+) -> Tuple[Dict[str, Any], List[str]]:
+  """Read a manifest and its sorted asset ids through a local cache (see from_manifest)."""
+  manifest_path = file_io.as_path(manifest_path)
+  url_key = hashlib.sha1(str(manifest_path).encode("utf-8")).hexdigest()[:16]
+  local_dir = pathlib.Path(cache_dir).expanduser() / url_key
+  local_cache = local_dir / "manifest.pkl"
+
+  # a cache hit costs one (remote) stat call plus unpickling the parsed manifest
+  remote_mtime = manifest_path.stat().mtime
+  if local_cache.exists():
+    with open(local_cache, "rb") as fp:
+      cached = pickle.load(fp)
+    if cached["mtime"] == remote_mtime:
+      return cached["manifest"], cached["asset_ids"]
+
+  manifest = file_io.read_json(manifest_path)
+  asset_ids = sorted(manifest["assets"])
+  local_dir.mkdir(parents=True, exist_ok=True)
+  # replaced atomically, so concurrent readers never see a partially written cache
+  cached = {"mtime": remote_mtime, "manifest": manifest, "asset_ids": asset_ids}
+  _write_atomically(local_cache, "wb", lambda fp: pickle.dump(cached, fp))
+  return manifest, asset_ids
+
+
+def _write_atomically(path: pathlib.Path, mode: str, write_fn):
+  """Write to a temporary file next to path and then move it into place."""
+  with tempfile.NamedTemporaryFile(mode, dir=path.parent, delete=False) as fp:
+    write_fn(fp)
+  os.replace(fp.name, path)
+
+
 class ClosableResource:
   """TODO(klausg): documentation."""
   _set_of_open_resources = weakref.WeakSet()
@@ -62,8 +99,19 @@ class AssetSource(ClosableResource):
   def from_manifest(
       cls,
       manifest_path: PathLike,
-      scratch_dir: Optional[PathLike] = None
+      scratch_dir: Optional[PathLike] = None,
+      cache_dir: Optional[PathLike] = None,
   ) -> "AssetSource":
+    """Create an AssetSource from a (local or remote) manifest file.
+
+    Args:
+      manifest_path: path or URL of the manifest JSON file.
+      scratch_dir: directory in which the asset files are unpacked.
+      cache_dir: if set, the manifest and its sorted asset ids are cached in this directory
+        and only downloaded again when the modification time of manifest_path changes.
+        Note that the modification time has a resolution of one second, so a manifest that
+        is rewritten within the same second as the cached copy is not picked up.
+    """
     if manifest_path == "gs://kubric-public/assets/ShapeNetCore.v2.json":
       raise ValueError(f"The path `{manifest_path}` is a placeholder for the real path. "
                        "Please visit https://shapenet.org, agree to terms and conditions."
@@ -71,18 +119,23 @@ class AssetSource(ClosableResource):
                        "https://shapenet.org/download/kubric")
 
     manifest_path = file_io.as_path(manifest_path)
-    manifest = file_io.read_json(manifest_path)
+    if cache_dir is None:
+      manifest, asset_ids = file_io.read_json(manifest_path), None
+    else:
+      manifest, asset_ids = _read_cached_manifest(manifest_path, cache_dir)
     name = manifest.get("name", manifest_path.stem)  # default to filename
     data_dir = manifest.get("data_dir", manifest_path.parent)  # default to manifest dir
     assets = manifest["assets"]
-    return cls(name=name, data_dir=data_dir, assets=assets, scratch_dir=scratch_dir)
+    return cls(name=name, data_dir=data_dir, assets=assets, scratch_dir=scratch_dir,
+               asset_ids=asset_ids)
 
   def __init__(
       self,
       name: str,
       data_dir: PathLike,
       assets: Dict[str, Any],
-      scratch_dir: Optional[PathLike] = None
+      scratch_dir: Optional[PathLike] = None,
+      asset_ids: Optional[Sequence[str]] = None,
   ):
     super().__init__()
     self.name = name
@@ -91,6 +144,14 @@ class AssetSource(ClosableResource):
                  name, len(assets), self.data_dir)
     self.local_dir = pathlib.Path(tempfile.mkdtemp(prefix=name, dir=scratch_dir))
     self._assets = assets
+    self._asset_ids = None if asset_ids is None else list(asset_ids)
+
+  @property
+  def asset_ids(self) -> List[str]:
+    """Sorted list of the ids of all assets in this source."""
+    if self._asset_ids is None:
+      self._asset_ids = sorted(self._assets)
+    return self._asset_ids
 
   def close(self):
     if self.is_closed:
@@ -189,6 +250,18 @@ class AssetSource(ClosableResource):
 
     return asset
 
+  def prefetch(self, asset_id: str) -> None:
+    """Fetch and unpack the files of an asset without creating an instance of it.
+
+    Meant to be called ahead of time (e.g. from a background thread) so that a later
+    `create(asset_id)` finds the files in the local cache. Do not call `create` for the same
+    asset_id before the prefetch has finished.
+    """
+    asset_entry = self._assets[asset_id]
+    asset_path = self._resolve_asset_path(asset_entry.get("path", ""), asset_id)
+    if asset_path is not None:
+      self.fetch(asset_path, asset_id)
+
   def fetch(self, asset_path, asset_id):
     local_path = self.local_dir / (asset_id + ".tar.gz")
     if not local_path.exists():
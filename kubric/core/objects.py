@@ -97,6 +97,81 @@ def look_at_quat(
   return tuple(pyquat.Quaternion(matrix=(rotation_matrix1.T @ rotation_matrix2)))
 
 
+def look_at_quats(
+    positions: ArrayLike,
+    target: ArrayLike,
+    up: Union[str, ArrayLike] = "Y",
+    front: Union[str, ArrayLike] = "-Z",
+) -> np.ndarray:
+  """Batched version of `look_at_quat` for an (N, 3) array of positions.
+
+  Returns an (N, 4) array with the same (W, X, Y, Z) quaternions that `look_at_quat` would
+  return for each of the positions.
+  """
+  world_up = convert_str_direction_to_vector("Z")
+  world_right = convert_str_direction_to_vector("X")
+  if isinstance(up, str):
+    up = convert_str_direction_to_vector(up)
+  if isinstance(front, str):
+    front = convert_str_direction_to_vector(front)
+
+  up = normalize(ensure_3d_vector(up))
+  front = normalize(ensure_3d_vector(front))
+  right = np.cross(up, front)
+
+  target = ensure_3d_vector(target)
+  positions = np.asarray(positions, dtype=np.float64)
+  if positions.ndim != 2 or positions.shape[1] != 3:
+    raise ValueError(f"Expected shape=(N, 3), got {positions.shape}")
+
+  # construct the desired coordinate basis front, right, up (one per row)
+  look_at_front = _normalize_rows(target - positions)
+  look_at_right = _normalize_rows(np.cross(world_up, look_at_front), fallback=world_right)
+  look_at_up = _normalize_rows(np.cross(look_at_front, look_at_right))
+
+  rotation_matrices1 = np.stack([look_at_right, look_at_up, look_at_front], axis=1)
+  rotation_matrix2 = np.stack([right, up, front])
+  return _rotation_matrices_to_quats(np.swapaxes(rotation_matrices1, 1, 2) @ rotation_matrix2)
+
+
+def _normalize_rows(
+    x: np.ndarray,
+    eps: float = 1.0e-8,
+    fallback: Optional[ArrayLike] = None
+) -> np.ndarray:
+  """Row-wise `normalize` for an (N, 3) array."""
+  norm_x = np.linalg.norm(x, axis=1, keepdims=True)
+  too_small = norm_x[:, 0] < eps
+  if np.any(too_small) and fallback is None:
+    raise ValueError("Expected non-zero vector.")
+  x = x / np.where(too_small[:, None], 1., norm_x)
+  x[too_small] = fallback
+  return x
+
+
+def _rotation_matrices_to_quats(matrices: np.ndarray) -> np.ndarray:
+  """Converts (N, 3, 3) rotation matrices to (N, 4) WXYZ quaternions.
+
+  Uses the same case distinction (and hence the same signs) as `pyquat.Quaternion(matrix=...)`.
+  """
+  m = np.swapaxes(matrices, 1, 2)
+  m00, m11, m22 = m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]
+  conditions = [(m22 < 0) & (m00 > m11),
+                (m22 < 0),
+                (m00 < -m11)]
+  t = np.select(conditions, [1 + m00 - m11 - m22,
+                             1 - m00 + m11 - m22,
+                             1 - m00 - m11 + m22],
+                default=1 + m00 + m11 + m22)
+  q = np.select([c[:, None] for c in conditions], [
+      np.stack([m[:, 1, 2] - m[:, 2, 1], t, m[:, 0, 1] + m[:, 1, 0], m[:, 2, 0] + m[:, 0, 2]], 1),
+      np.stack([m[:, 2, 0] - m[:, 0, 2], m[:, 0, 1] + m[:, 1, 0], t, m[:, 1, 2] + m[:, 2, 1]], 1),
+      np.stack([m[:, 0, 1] - m[:, 1, 0], m[:, 2, 0] + m[:, 0, 2], m[:, 1, 2] + m[:, 2, 1], t], 1),
+  ], default=np.stack([t, m[:, 1, 2] - m[:, 2, 1], m[:, 2, 0] - m[:, 0, 2],
+                       m[:, 0, 1] - m[:, 1, 0]], 1))
+  return q * (0.5 / np.sqrt(t))[:, None]
+
+
 def _euler_to_quat(euler_angles):
   """ Convert three (euler) angles around XYZ to a single quaternion."""
   q1 = pyquat.Quaternion(axis=[1., 0., 0.], angle=euler_angles[0])
@@ -26,9 +26,27 @@ def compute_visibility(segmentation: np.ndarray, assets: Sequence[core.Asset]):
     assets: The list of assets in the scene (whose ordering corresponds to the segmentation indices)
 
   """
+  # count all instance ids of a frame in a single pass instead of one comparison per asset
+  num_ids = len(assets) + 1
+  visibility = np.stack([np.bincount(frame.ravel(), minlength=num_ids)[:num_ids]
+                         for frame in np.asarray(segmentation)]).reshape(-1, num_ids)
   for i, asset in enumerate(assets, start=1):
-    asset.metadata["visibility"] = [int(np.sum(segmentation[t] == i))
-                                    for t in range(segmentation.shape[0])]
+    asset.metadata["visibility"] = visibility[:, i].tolist()
+
+
+def get_visible_assets(assets: Sequence[core.Asset]):
+  """Returns the assets that are visible in at least one frame, sorted by decreasing visibility.
+
+  Requires asset.metadata["visibility"] to be set (see `compute_visibility`). Assets with equal
+  total visibility keep their relative order.
+  """
+  if not assets:
+    return []
+  visibility = np.array([asset.metadata["visibility"] for asset in assets], dtype=np.int64)
+  visible_idxs = np.flatnonzero(visibility.max(axis=1) > 0)
+  total_visibility = visibility.sum(axis=1)
+  visible_idxs = visible_idxs[np.argsort(-total_visibility[visible_idxs], kind="stable")]
+  return [assets[i] for i in visible_idxs]
 
 
 def adjust_segmentation_idxs(
@@ -41,29 +59,42 @@ def adjust_segmentation_idxs(
   Note that this starts with index=1 for the first asset in new_assets_list, to leave id=0 for
   background assets.
   """
-  new_segmentation = np.zeros_like(segmentation)
+  segmentation = np.asarray(segmentation)
+  # build a lookup table old_id -> new_id (ids without an asset map to 0) and gather once
+  max_id = int(segmentation.max()) if segmentation.size else 0
+  lookup = np.zeros(max(max_id, len(old_assets_list)) + 1, dtype=segmentation.dtype)
   for i, asset in enumerate(old_assets_list, start=1):
     if isinstance(asset, core.PhysicalObject) and asset.segmentation_id is not None:
-      new_segmentation[segmentation == i] = asset.segmentation_id
+      lookup[i] = asset.segmentation_id
     elif asset in new_assets_list:
-      new_segmentation[segmentation == i] = new_assets_list.index(asset) + 1
+      lookup[i] = new_assets_list.index(asset) + 1
     else:
-      new_segmentation[segmentation == i] = ignored_label
-  return new_segmentation
+      lookup[i] = ignored_label
+  return lookup[segmentation]
 
 
 def compute_bboxes(segmentation: ArrayLike, asset_list: Sequence[core.Asset]):
-  for k, asset in enumerate(asset_list, start=1):
+  for asset in asset_list:
     asset.metadata["bboxes"] = []
     asset.metadata["bbox_frames"] = []
-    for t in range(segmentation.shape[0]):
-      seg = segmentation[t, ..., 0]
-      idxs = np.array(np.where(seg == k), dtype=np.float32)
-      if idxs.size > 0:
-        y_min = float(idxs[0].min() / seg.shape[0])
-        x_min = float(idxs[1].min() / seg.shape[1])
-        y_max = float((idxs[0].max() + 1) / seg.shape[0])
-        x_max = float((idxs[1].max() + 1) / seg.shape[1])
+  num_ids = len(asset_list) + 1
+  for t in range(segmentation.shape[0]):
+    seg = np.asarray(segmentation[t, ..., 0])
+    seg = np.where(seg < num_ids, seg, 0)  # ignore ids of assets that are not in asset_list
+    height, width = seg.shape
+    # mark which rows / columns each id occurs in, in one pass over the frame
+    rows = np.zeros((num_ids, height), dtype=bool)
+    cols = np.zeros((num_ids, width), dtype=bool)
+    rows[seg, np.arange(height)[:, None]] = True
+    cols[seg, np.arange(width)[None, :]] = True
+    for k, asset in enumerate(asset_list, start=1):
+      row_idxs = np.flatnonzero(rows[k]).astype(np.float32)
+      if row_idxs.size > 0:
+        col_idxs = np.flatnonzero(cols[k]).astype(np.float32)
+        y_min = float(row_idxs[0] / height)
+        x_min = float(col_idxs[0] / width)
+        y_max = float((row_idxs[-1] + 1) / height)
+        x_max = float((col_idxs[-1] + 1) / width)
         asset.metadata["bboxes"].append((y_min, x_min, y_max, x_max))
         asset.metadata["bbox_frames"].append(t)
 
@@ -17,9 +17,10 @@ import collections
 import io
 import logging
 import os
+import subprocess
 import sys
 from contextlib import redirect_stdout
-from typing import Any, Dict, Optional, Sequence, Union
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
 import tempfile
 
 from kubric.safeimport.bpy import bpy
@@ -39,6 +40,32 @@ from kubric.file_io import PathLike
 
 logger = logging.getLogger(__name__)
 
+# Executed by each worker process of a sharded render (see Blender.render).
+# Only depends on bpy so that workers do not have to import kubric.
+_RENDER_SHARD_SCRIPT = """
+import sys
+import bpy
+blend_file, images_dir, device_type, device_index, num_threads = sys.argv[1:6]
+bpy.ops.wm.open_mainfile(filepath=blend_file)
+if device_type != "NONE":  # device preferences are not stored in the .blend file
+  # each worker renders on its own GPU (Cycles would otherwise use all of them in every worker)
+  cycles_preferences = bpy.context.preferences.addons["cycles"].preferences
+  cycles_preferences.compute_device_type = device_type
+  cycles_preferences.get_devices()
+  gpus = [device for device in cycles_preferences.devices if device.type == device_type]
+  for device in cycles_preferences.devices:
+    device.use = False
+  gpus[int(device_index)].use = True
+else:
+  # share the CPU cores between the workers instead of each of them using all cores
+  bpy.context.scene.render.threads_mode = "FIXED"
+  bpy.context.scene.render.threads = int(num_threads)
+for frame_nr in map(int, sys.argv[6:]):
+  bpy.context.scene.frame_set(frame_nr)
+  bpy.context.scene.render.filepath = f"{images_dir}/frame_{frame_nr:04d}.png"
+  bpy.ops.render.render(animation=False, write_still=True)
+"""
+
 
 # noinspection PyUnresolvedReferences
 class Blender(core.View):
@@ -181,17 +208,32 @@ class Blender(core.View):
 
   @use_gpu.setter
   def use_gpu(self, value: bool):
-    self.blender_scene.cycles.device = "GPU" if value else "CPU"
+    self.blender_scene.cycles.device = "CPU"
     if value:
-      # call get_devices() to let Blender detect GPU devices
-      preferences = bpy.context.preferences
-      cycles_preferences = preferences.addons['cycles'].preferences
-      cuda_devices, opencl_devices = cycles_preferences.get_devices()
-      cycles_preferences.compute_device_type = "CUDA"
-
-      for device in cuda_devices:
-        logger.info("Activating: %s", device.name)
+      if self._activate_gpu_devices():
+        self.blender_scene.cycles.device = "GPU"
+      else:
+        logger.warning("No usable GPU found, rendering on the CPU instead.")
+
+  @staticmethod
+  def _activate_gpu_devices() -> bool:
+    """Enables all OptiX (or else CUDA) devices and returns whether any were found."""
+    cycles_preferences = bpy.context.preferences.addons["cycles"].preferences
+    for device_type in ("OPTIX", "CUDA"):
+      try:
+        cycles_preferences.compute_device_type = device_type
+        # call get_devices() to let Blender detect GPU devices
+        cycles_preferences.get_devices()
+      except (TypeError, ValueError, RuntimeError):
+        continue  # device type not supported by this Blender build
+      devices = [d for d in cycles_preferences.devices if d.type == device_type]
+      for device in devices:
+        logger.info("Activating: %s (%s)", device.name, device_type)
         device.use = True
+      if devices:
+        return True
+    cycles_preferences.compute_device_type = "NONE"
+    return False
 
 
   def set_exr_output_path(self, path_prefix: Optional[PathLike]):
@@ -245,6 +287,7 @@ class Blender(core.View):
                                              "forward_flow", "depth",
                                              "normal", "object_coordinates",
                                              "segmentation"),
+             num_workers: int = 1,
              ) -> Dict[str, np.ndarray]:
     """Renders all frames (or a subset) of the animation and returns images as a dict of arrays.
 
@@ -255,6 +298,8 @@ class Blender(core.View):
       return_layers: list of layers to return. For possible values refer to
         the Blender.post_processors dict. Defaults to ("backward_flow",
         "forward_flow", "depth", "normal", "object_coordinates", "segmentation").
+      num_workers: if larger than one, the scene is saved to the scratch_dir and the frames are
+        split into contiguous chunks that are rendered by separate Blender processes in parallel.
 
     Returns:
       A dictionary with one entry for each return layer. By default:
@@ -273,19 +318,69 @@ class Blender(core.View):
     # --- starts rendering
     if frames is None:
       frames = range(self.scene.frame_start, self.scene.frame_end + 1)
-    with RedirectStream(stream=sys.stdout, disabled=self.verbose):
-      for frame_nr in frames:
-        bpy.context.scene.frame_set(frame_nr)
-        # When writing still images Blender doesn't append the frame number to the png path.
-        # (but for exr it does, so we only adjust the png path)
-        bpy.context.scene.render.filepath = str(
-            self.scratch_dir / "images" / f"frame_{frame_nr:04d}.png")
-        bpy.ops.render.render(animation=False, write_still=True)
-        logger.info("Rendered frame '%s'", bpy.context.scene.render.filepath)
+    if num_workers > 1:
+      self._render_sharded(frames, num_workers)
+    else:
+      with RedirectStream(stream=sys.stdout, disabled=self.verbose):
+        for frame_nr in frames:
+          bpy.context.scene.frame_set(frame_nr)
+          # When writing still images Blender doesn't append the frame number to the png path.
+          # (but for exr it does, so we only adjust the png path)
+          bpy.context.scene.render.filepath = str(
+              self.scratch_dir / "images" / f"frame_{frame_nr:04d}.png")
+          bpy.ops.render.render(animation=False, write_still=True)
+          logger.info("Rendered frame '%s'", bpy.context.scene.render.filepath)
 
     # --- post process the rendered frames
     return self.postprocess(self.scratch_dir, return_layers=return_layers)
 
+  def _render_sharded(self, frames: Sequence[int], num_workers: int):
+    """Renders the frames with up to num_workers Blender processes (one per chunk of frames).
+
+    Each worker gets its own hardware: on the GPU, worker i only uses GPU i (so num_workers is
+    capped at the number of GPUs), on the CPU, the cores are split evenly between the workers.
+    All workers write into the same scratch_dir, using the same file naming as the serial
+    render loop, so the results can be collected with `postprocess` as usual.
+    """
+    device_type = "NONE"
+    if self.use_gpu:
+      device_type, num_gpus = self._get_active_gpu_devices()
+      num_workers = max(1, min(num_workers, num_gpus))
+    blend_file = self.scratch_dir / "shards" / "scene.blend"
+    blend_file.parent.mkdir(parents=True, exist_ok=True)
+    blend_file.unlink(missing_ok=True)  # otherwise Blender keeps the old one as scene.blend1
+    # save a copy, which leaves the current (in-process) Blender session untouched
+    with RedirectStream(stream=sys.stdout, disabled=self.verbose):
+      bpy.ops.wm.save_as_mainfile(filepath=str(blend_file), copy=True)
+    shards = [shard for shard in np.array_split(np.asarray(list(frames)), num_workers)
+              if shard.size]
+    images_dir = self.scratch_dir / "images"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    num_threads = max(1, (os.cpu_count() or 1) // len(shards))
+
+    stdout = None if self.verbose else subprocess.DEVNULL
+    processes = []
+    for device_index, shard in enumerate(shards):
+      cmd = [sys.executable, "-c", _RENDER_SHARD_SCRIPT, str(blend_file), str(images_dir),
+             device_type, str(device_index), str(num_threads)]
+      cmd += [str(frame_nr) for frame_nr in shard]
+      logger.info("Rendering frames %d-%d in a separate process", shard[0], shard[-1])
+      processes.append(subprocess.Popen(cmd, stdout=stdout))
+
+    failed = [f"{shard[0]}-{shard[-1]}" for shard, process in zip(shards, processes)
+              if process.wait() != 0]
+    if failed:
+      raise RuntimeError(f"Rendering failed for frames {failed}")
+
+  @staticmethod
+  def _get_active_gpu_devices() -> Tuple[str, int]:
+    """Returns the Cycles compute device type and the number of enabled devices of that type."""
+    cycles_preferences = bpy.context.preferences.addons["cycles"].preferences
+    device_type = cycles_preferences.compute_device_type
+    num_devices = sum(1 for device in cycles_preferences.devices
+                      if device.type == device_type and device.use)
+    return device_type, num_devices
+
   def _check_missing_textures(self):
     missing_textures = sorted({img.filepath for img in bpy.data.images
             if tuple(img.size) == (0, 0) and img.filepath})
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import pytest
+
 from kubric.safeimport.bpy import bpy
 
 from kubric import core
@@ -141,3 +143,94 @@ def test_blender_samples_per_pixel_init(tmp_path):
   renderer = blender.Blender(core.Scene(), tmp_path, samples_per_pixel=256)
   assert renderer.samples_per_pixel == 256
   assert renderer.blender_scene.cycles.samples == 256
+
+
+def test_blender_use_gpu_falls_back_to_cpu(tmp_path, monkeypatch):
+  monkeypatch.setattr(blender.Blender, "_activate_gpu_devices", staticmethod(lambda: False))
+  renderer = blender.Blender(core.Scene(), tmp_path)
+  renderer.use_gpu = True
+  assert renderer.use_gpu is False
+  assert renderer.blender_scene.cycles.device == "CPU"
+
+
+def test_blender_use_gpu_with_gpu(tmp_path, monkeypatch):
+  monkeypatch.setattr(blender.Blender, "_activate_gpu_devices", staticmethod(lambda: True))
+  renderer = blender.Blender(core.Scene(), tmp_path)
+  renderer.use_gpu = True
+  assert renderer.use_gpu is True
+  assert renderer.blender_scene.cycles.device == "GPU"
+
+
+def test_blender_set_use_gpu_false(tmp_path):
+  renderer = blender.Blender(core.Scene(), tmp_path)
+  renderer.use_gpu = False
+  assert renderer.use_gpu is False
+  assert renderer.blender_scene.cycles.device == "CPU"
+
+
+class _FakeRenderProcess:
+  """Stands in for subprocess.Popen; records the commands of the render workers."""
+  commands = []
+  failing_frames = ()
+
+  def __init__(self, cmd, **kwargs):
+    del kwargs
+    self.frames = [int(f) for f in cmd[8:]]
+    _FakeRenderProcess.commands.append(cmd)
+
+  def wait(self):
+    return 1 if set(self.frames) & set(self.failing_frames) else 0
+
+
+def test_blender_render_sharded_splits_frames(tmp_path, monkeypatch):
+  monkeypatch.setattr(blender.subprocess, "Popen", _FakeRenderProcess)
+  monkeypatch.setattr(_FakeRenderProcess, "commands", [])
+  renderer = blender.Blender(core.Scene(), tmp_path)
+
+  renderer._render_sharded(range(1, 6), num_workers=2)
+  assert [cmd[8:] for cmd in _FakeRenderProcess.commands] == [["1", "2", "3"], ["4", "5"]]
+  assert all(cmd[3] == str(tmp_path / "shards" / "scene.blend")
+             for cmd in _FakeRenderProcess.commands)
+  assert (tmp_path / "shards" / "scene.blend").exists()
+
+  # never more workers than frames
+  _FakeRenderProcess.commands.clear()
+  renderer._render_sharded([7, 8], num_workers=4)
+  assert [cmd[8:] for cmd in _FakeRenderProcess.commands] == [["7"], ["8"]]
+
+
+def test_blender_render_sharded_raises_on_failed_worker(tmp_path, monkeypatch):
+  monkeypatch.setattr(blender.subprocess, "Popen", _FakeRenderProcess)
+  monkeypatch.setattr(_FakeRenderProcess, "commands", [])
+  monkeypatch.setattr(_FakeRenderProcess, "failing_frames", (4,))
+  renderer = blender.Blender(core.Scene(), tmp_path)
+
+  with pytest.raises(RuntimeError, match="4-5"):
+    renderer._render_sharded(range(1, 6), num_workers=2)
+  assert len(_FakeRenderProcess.commands) == 2  # all workers were started
+
+
+def test_blender_render_sharded_splits_cpu_threads(tmp_path, monkeypatch):
+  monkeypatch.setattr(blender.subprocess, "Popen", _FakeRenderProcess)
+  monkeypatch.setattr(_FakeRenderProcess, "commands", [])
+  monkeypatch.setattr(blender.os, "cpu_count", lambda: 8)
+  renderer = blender.Blender(core.Scene(), tmp_path)
+  renderer.use_gpu = False
+
+  renderer._render_sharded(range(1, 6), num_workers=2)
+  # (device_type, device_index, num_threads) of each worker
+  assert [cmd[5:8] for cmd in _FakeRenderProcess.commands] == [["NONE", "0", "4"],
+                                                               ["NONE", "1", "4"]]
+
+
+def test_blender_render_sharded_one_gpu_per_worker(tmp_path, monkeypatch):
+  monkeypatch.setattr(blender.subprocess, "Popen", _FakeRenderProcess)
+  monkeypatch.setattr(_FakeRenderProcess, "commands", [])
+  monkeypatch.setattr(blender.Blender, "_get_active_gpu_devices",
+                      staticmethod(lambda: ("CUDA", 2)))
+  renderer = blender.Blender(core.Scene(), tmp_path)
+  renderer.blender_scene.cycles.device = "GPU"
+
+  renderer._render_sharded(range(1, 7), num_workers=3)  # capped at the number of GPUs
+  assert [cmd[5:7] for cmd in _FakeRenderProcess.commands] == [["CUDA", "0"], ["CUDA", "1"]]
+  assert [cmd[8:] for cmd in _FakeRenderProcess.commands] == [["1", "2", "3"], ["4", "5", "6"]]
@@ -120,6 +120,15 @@ def test_look_at_quat_front_points_toward_target():
   assert np.allclose(direction, dir_expected)
 
 
+def test_look_at_quats_matches_look_at_quat():
+  positions = np.array([[1., 2., 3.], [0., 0., 5.], [-4., 1., -2.]])
+  target = (0.5, 0., 1.)
+  quats = objects.look_at_quats(positions, target, up="Z", front="X")
+  assert quats.shape == (3, 4)
+  for position, quat in zip(positions, quats):
+    assert_allclose(quat, objects.look_at_quat(position, target, up="Z", front="X"), atol=1e-12)
+
+
 def test_object3d_constructor_look_at():
   obj = objects.Object3D(look_at=(0, 0, 1))
   assert_allclose(obj.quaternion, (0, 0, 1, 0), atol=1e-6)  # TODO: double check
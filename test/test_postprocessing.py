@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from kubric import post_processing
 from kubric.renderer import blender_utils
 
 from kubric.core.scene import Scene
@@ -65,6 +66,49 @@ def test_mm3hash():
     assert blender_utils.mm3hash(name) == expected
 
 
+def test_compute_visibility():
+  segmentation = np.array([[[0, 1], [1, 2]],
+                           [[0, 0], [2, 3]]])[..., None]
+  assets = [objects.Cube(), objects.Sphere()]
+  post_processing.compute_visibility(segmentation, assets)
+  assert assets[0].metadata["visibility"] == [2, 0]
+  assert assets[1].metadata["visibility"] == [1, 1]
+
+
+def test_get_visible_assets():
+  assets = [objects.Cube(), objects.Sphere(), objects.Cube(), objects.Sphere()]
+  for asset, visibility in zip(assets, [[0, 3], [0, 0], [5, 1], [2, 1]]):
+    asset.metadata["visibility"] = visibility
+  assert post_processing.get_visible_assets(assets) == [assets[2], assets[0], assets[3]]
+
+
+def test_get_visible_assets_without_assets():
+  assert post_processing.get_visible_assets(()) == []
+
+
+def test_compute_bboxes():
+  segmentation = np.zeros((2, 4, 5, 1), dtype=np.uint32)
+  segmentation[0, 1:3, 2:5] = 1
+  segmentation[1, 0, 0] = 2
+  segmentation[1, 3, 4] = 3  # not in the asset list
+  assets = [objects.Cube(), objects.Sphere()]
+  post_processing.compute_bboxes(segmentation, assets)
+  np.testing.assert_allclose(assets[0].metadata["bboxes"], [(0.25, 0.4, 0.75, 1.0)])
+  assert assets[0].metadata["bbox_frames"] == [0]
+  np.testing.assert_allclose(assets[1].metadata["bboxes"], [(0.0, 0.0, 0.25, 0.2)])
+  assert assets[1].metadata["bbox_frames"] == [1]
+
+
+def test_adjust_segmentation_idxs():
+  segmentation = np.array([[0, 1, 2], [3, 4, 5]], dtype=np.uint8)[None, ..., None]
+  cube, sphere, hidden = objects.Cube(), objects.Sphere(), objects.Cube()
+  fixed = objects.Sphere(segmentation_id=7)
+  new_segmentation = post_processing.adjust_segmentation_idxs(
+      segmentation, [cube, sphere, hidden, fixed], [sphere, cube])
+  assert new_segmentation.dtype == np.uint8
+  np.testing.assert_array_equal(new_segmentation[0, ..., 0], [[0, 2, 1], [0, 7, 0]])
+
+
 @pytest.mark.skip(reason="TODO(klausg)")
 def test_optical_flow():
   # --- create scene and attach a renderer to it